@@ -0,0 +1,467 @@
+"""
+Concurrent access to Launchpad for ustriage.
+
+Searches and bug loads are independent round trips to Launchpad, so they
+run in a pool of worker threads, each with a Launchpad login of its own.
+
+Copyright 2017-2021 Canonical Ltd.
+"""
+import concurrent.futures
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import json
+import logging
+import os
+import threading
+from typing import NamedTuple, Optional
+
+DISTRIBUTION_RESOURCE_TYPE_LINK = (
+    'https://api.launchpad.net/devel/#distribution'
+)
+
+ACTIVITY_CACHE_FILE = os.path.expanduser('~/.cache/ustriage/activity.json')
+# Bump whenever the layout of the cached data changes
+ACTIVITY_CACHE_VERSION = 3
+# Days after which bugs no longer looked at are dropped from the cache
+ACTIVITY_CACHE_MAX_AGE = 30
+
+# Number of concurrent requests to issue against Launchpad. Every worker
+# logs in on its own, which costs a service root request and a parse of the
+# Launchpad WADL that holds the GIL, so only a few of them pay off.
+LAUNCHPAD_WORKERS = 4
+
+_THREAD_LOCAL = threading.local()
+# Results of search_tasks() keyed by the frozen search arguments
+_SEARCH_CACHE = {}
+# Results of active_series_links() keyed by the distribution self_link
+_ACTIVE_SERIES = {}
+# Results of owner_suspended() keyed by the person self_link
+_SUSPENDED = {}
+# ActivityCache objects loaded by activity_cache() keyed by their filename
+_ACTIVITY_CACHES = {}
+# Shared by all callers so that the workers, and with them the Launchpad
+# logins in thread_launchpad(), are kept for the whole run. A worker is only
+# started when no idle one is left, so a run never has more of them than
+# min(LAUNCHPAD_WORKERS, jobs in flight).
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=LAUNCHPAD_WORKERS)
+
+
+def login_launchpad():
+    """Use the launchpad module connect to launchpad.
+
+    Will connect you to the Launchpad website the first time you run
+    this to authorize your system to connect.
+    """
+    # launchpadlib and its dependencies take a while to import, only pay
+    # for that when connecting and not for --help or argument errors
+    # pylint: disable=import-outside-toplevel
+    from launchpadlib.launchpad import Launchpad
+    from launchpadlib.credentials import UnencryptedFileCredentialStore
+
+    cred_location = os.path.expanduser('~/.lp_creds')
+    credential_store = UnencryptedFileCredentialStore(cred_location)
+    return Launchpad.login_with('ustriage', 'production', version='devel',
+                                credential_store=credential_store)
+
+
+@lru_cache(maxsize=None)
+def connect_launchpad():
+    """Return the Launchpad connection, logging in on first use only."""
+    return login_launchpad()
+
+
+@lru_cache(maxsize=None)
+def get_distribution(launchpad, name):
+    """Return a distribution object, fetched once per Launchpad connection."""
+    return launchpad.distributions[name]
+
+
+def get_ubuntu():
+    """Return the Ubuntu distribution object, fetched on first use only."""
+    return get_distribution(connect_launchpad(), 'ubuntu')
+
+
+@lru_cache(maxsize=None)
+def get_person(name):
+    """Return a Launchpad person or team object, fetched on first use only."""
+    return connect_launchpad().people[name]
+
+
+def thread_launchpad():
+    """Return a Launchpad connection private to the calling thread.
+
+    launchpadlib is built on httplib2 which is not thread-safe, so worker
+    threads log in on their own instead of sharing a connection.
+    """
+    if not hasattr(_THREAD_LOCAL, 'launchpad'):
+        _THREAD_LOCAL.launchpad = login_launchpad()
+    return _THREAD_LOCAL.launchpad
+
+
+def pool_map(function, *iterables):
+    """Map function over the iterables in the worker pool, keeping order.
+
+    function runs in worker threads, so it must use thread_launchpad() for
+    any access to Launchpad.
+    """
+    return _EXECUTOR.map(function, *iterables)
+
+
+def fast_target_name(obj):
+    """Return the name of a bug task's target.
+
+    This is an optimisation hack that saves us from fetching the target object
+    in order to determine its name.
+
+    :param obj: bug_task object from launchpadlib
+    :returns: the equivalent of obj.target.name
+    """
+    return obj.target_link.split('/')[-1]
+
+
+def active_series_links(distro):
+    """Return the self_links of the active series of a distribution.
+
+    The series of a distribution do not change during a run, so they are
+    only listed once.
+    """
+    if distro.self_link not in _ACTIVE_SERIES:
+        _ACTIVE_SERIES[distro.self_link] = [
+            series.self_link
+            for series in distro.series_collection
+            if series.active
+        ]
+    return _ACTIVE_SERIES[distro.self_link]
+
+
+def search_target(target_link, *args, **kwargs):
+    """Run searchTasks() on a distribution or series in a worker thread.
+
+    :param str target_link: self_link of the distribution or series
+    :rtype: list(bug_task object from launchpadlib)
+    """
+    target = thread_launchpad().load(target_link)
+    return list(target.searchTasks(*args, **kwargs))
+
+
+def start_search_in_all_active_series(distro, *args, **kwargs):
+    """Start searchTasks() in all active series of a distribution.
+
+    A searchTasks() Launchpad call against a Launchpad distribution will not
+    return series tasks if the development task is marked Fix Released (LP:
+    #314432; see also comment 26 in that bug). The workaround is to call
+    searchTasks() individually against both the distribution object itself and
+    also against all required series and unionize the results. This function
+    and finish_search_in_all_active_series() provide an implementation of this
+    workaround.
+
+    One difference to calling searchTasks() directly is that the tasks returned
+    are targetted either to the distribution or to particular series. It is
+    not possible to return tasks targetted just to the distribution in the
+    general case because no such tasks exist for bugs where the development
+    task is marked Fix Released (the exact case we're fixing).
+
+    This implementation returns only one series task for each found bug and
+    package name, not all of them. An arbitrary task is picked. Only active
+    serieses are considered.
+
+    The searches against the distribution and each series are independent
+    round trips to Launchpad, so they run concurrently in the worker pool.
+    Starting several of these before finishing any overlaps them as well.
+
+    :param distro: distribution object from launchpadlib
+    :param *args: arguments to pass to the wrapped searchTasks calls
+    :param **kargs: arguments to pass to the wrapped searchTasks calls
+    :returns: list of futures to hand to finish_search_in_all_active_series()
+    """
+    # This workaround implementation is to be called on distribution objects
+    # only; other objects (typically a series directly) are not affected, and
+    # the caller shouldn't be using this workaround in that case. If needed, we
+    # could modify this to wrap searchTasks for other object types if we don't
+    # want the caller to have to know which to use, but YAGNI for now.
+    assert distro.resource_type_link == DISTRIBUTION_RESOURCE_TYPE_LINK
+
+    return [
+        _EXECUTOR.submit(search_target, target_link, *args, **kwargs)
+        for target_link in [distro.self_link] + active_series_links(distro)
+    ]
+
+
+def finish_search_in_all_active_series(futures):
+    """Unionize the results of start_search_in_all_active_series().
+
+    :rtype: sequence(bug_task object from launchpadlib)
+    """
+    result = {}
+    for future in futures:
+        # Deduplicate against the bug number and source package name as a
+        # key. Keying additionally on the distribution is not required
+        # because all results must be against the same distribution since
+        # that's what we queried against. Here, "target" must be a
+        # source_package object because we queried specifically against a
+        # distro_series so we can assume that a name attribute is always
+        # present.
+        for task in future.result():
+            result[(task.bug_link, fast_target_name(task))] = task
+
+    return result.values()
+
+
+def freeze_search_args(distro_link, kwargs):
+    """Turn search arguments into a hashable key for the search cache.
+
+    Launchpad objects are represented by their self_link and lists by tuples.
+    """
+    return (distro_link,) + tuple(sorted(
+        (name, tuple(value) if isinstance(value, list)
+         else getattr(value, 'self_link', value))
+        for name, value in kwargs.items()
+    ))
+
+
+def search_tasks(distro, **kwargs):
+    """Search the tasks of a distribution in all its active series.
+
+    :param distro: distribution object from launchpadlib
+    :param **kwargs: arguments to pass to the wrapped searchTasks calls
+    :returns: dict of bug_task objects keyed by their self_link
+    """
+    return search_tasks_concurrently(distro, {None: kwargs})[None]
+
+
+def search_tasks_concurrently(distro, queries):
+    """Run independent task searches against a distribution concurrently.
+
+    Each search is a set of high latency round trips to Launchpad, running
+    them in parallel makes the total cost that of the slowest search rather
+    than the sum of all of them. Results are cached for the run, so
+    repeating a search is free.
+
+    :param distro: distribution object from launchpadlib
+    :param dict queries: searchTasks arguments keyed by a name for the query
+    :returns: dict of the search_tasks() results keyed by the query name
+    """
+    keys = {
+        name: freeze_search_args(distro.self_link, kwargs)
+        for name, kwargs in queries.items()
+    }
+    pending = {
+        key: start_search_in_all_active_series(distro, **queries[name])
+        for name, key in keys.items()
+        if key not in _SEARCH_CACHE
+    }
+    for key, futures in pending.items():
+        _SEARCH_CACHE[key] = {
+            task.self_link: task
+            for task in finish_search_in_all_active_series(futures)
+        }
+    return {name: _SEARCH_CACHE[key] for name, key in keys.items()}
+
+
+class Activity(NamedTuple):
+    """A message on a bug: when it was written and by whom.
+
+    suspended tells whether the account of the owner is suspended, None as
+    long as that was not looked up.
+    """
+
+    date: datetime
+    owner_link: str
+    suspended: Optional[bool] = None
+
+
+class ActivityCache:
+    """Recent activity of bugs, kept on disk between runs.
+
+    Maps the self_link of a bug to its date_last_updated, the (date,
+    person.self_link, suspended) records of its last messages as of that
+    update and the day the entry was last used. Entries unused for
+    ACTIVITY_CACHE_MAX_AGE days are dropped when saving.
+    """
+
+    def __init__(self, filename):
+        """Load the cache from filename, starting empty if that fails."""
+        self.filename = filename
+        self.bugs = {}
+        # Whether anything changed that needs to be saved
+        self.dirty = False
+        try:
+            with open(filename, "r", encoding='utf-8') as cache_file:
+                cache = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+        if cache.get('version') == ACTIVITY_CACHE_VERSION:
+            self.bugs = cache['bugs']
+
+    def get(self, bug_link, updated):
+        """Return the cached Activity records of a bug or None if outdated."""
+        entry = self.bugs.get(bug_link)
+        if not entry or entry['updated'] != updated:
+            return None
+        today = date.today().isoformat()
+        if entry['used'] != today:
+            entry['used'] = today
+            self.dirty = True
+        return [Activity(datetime.fromisoformat(created), owner, suspended)
+                for created, owner, suspended in entry['activity']]
+
+    def put(self, bug_link, updated, activity_list):
+        """Store the Activity records of a bug as of its last update."""
+        self.bugs[bug_link] = {
+            'updated': updated,
+            'used': date.today().isoformat(),
+            'activity': [(activity.date.isoformat(), activity.owner_link,
+                          activity.suspended)
+                         for activity in activity_list],
+        }
+        self.dirty = True
+
+    def save(self):
+        """Write the cache back to disk if anything changed.
+
+        The file is replaced atomically, so an interrupted or concurrent run
+        can not leave a truncated cache behind.
+        """
+        if not self.dirty:
+            return
+        oldest = (date.today()
+                  - timedelta(days=ACTIVITY_CACHE_MAX_AGE)).isoformat()
+        self.bugs = {link: entry for link, entry in self.bugs.items()
+                     if entry['used'] >= oldest}
+        tmp_filename = '%s.%d.tmp' % (self.filename, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            with open(tmp_filename, "w", encoding='utf-8') as cache_file:
+                json.dump({'version': ACTIVITY_CACHE_VERSION,
+                           'bugs': self.bugs}, cache_file)
+            os.replace(tmp_filename, self.filename)
+        except OSError as error:
+            logging.debug('Could not save %s: %s', self.filename, error)
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            return
+        self.dirty = False
+
+
+def activity_cache():
+    """Return the ActivityCache of this run, loading it on first use."""
+    if ACTIVITY_CACHE_FILE not in _ACTIVITY_CACHES:
+        _ACTIVITY_CACHES[ACTIVITY_CACHE_FILE] = ActivityCache(
+            ACTIVITY_CACHE_FILE)
+    return _ACTIVITY_CACHES[ACTIVITY_CACHE_FILE]
+
+
+def save_activity_cache():
+    """Write the activity cache back to disk for the next run.
+
+    Runs that never read any activity did not load it, nor is it saved then.
+    """
+    for cache in _ACTIVITY_CACHES.values():
+        cache.save()
+
+
+def owner_suspended(owner_link):
+    """Return whether the account of a message owner is suspended.
+
+    Launchpad answers 410 Gone for suspended accounts, which are usually
+    spammers. Each person is only looked up once per run.
+    """
+    # pylint: disable=import-outside-toplevel
+    from lazr.restfulclient.errors import ClientError
+
+    if owner_link not in _SUSPENDED:
+        try:
+            thread_launchpad().load(owner_link)
+        except ClientError as exc:
+            if exc.response["status"] != "410":
+                raise
+            _SUSPENDED[owner_link] = True
+        else:
+            _SUSPENDED[owner_link] = False
+    return _SUSPENDED[owner_link]
+
+
+def recent_activity(bug, activitysubscriber_links):
+    """Return Activity records of the last messages of a bug.
+
+    Messages of suspended accounts, typically spam, are left out. Only the
+    owners not in activitysubscriber_links are looked up for that.
+
+    Every new message updates the bug, so as long as date_last_updated is
+    unchanged the answer comes from the activity cache instead of Launchpad.
+    """
+    updated = bug.date_last_updated.isoformat()
+    cached_list = activity_cache().get(bug.self_link, updated)
+    if cached_list is None:
+        # 1. activity_list shall contain Activity(date, person.self_link)
+        #    records, owner_link is that self_link without fetching the
+        #    person itself
+        # 2. messages collection is ordered and the last few elements are
+        #    enough
+        # 3. message_count comes with the bug, len(bug.messages) would be an
+        #    extra round trip to fetch the first page of the collection
+        # This avoid too many API round trips to launchpad. With 0.1-0.5
+        # seconds per round trip and some overhead that is ~1.7s per bug now
+        # compared to the former rather excessive times on bugs with many
+        # comments
+        # Note: negative like [-3:] slices are not allowed here
+        last_msgs_end = bug.message_count
+        last_msgs_start = 0 if last_msgs_end < 3 else last_msgs_end-3
+        activity_list = [
+            Activity(msg.date_created, msg.owner_link)
+            for msg in bug.messages[last_msgs_start:last_msgs_end]
+        ]
+    else:
+        activity_list = cached_list
+
+    checked_list = [
+        activity._replace(suspended=owner_suspended(activity.owner_link))
+        if activity.suspended is None
+        and activity.owner_link not in activitysubscriber_links
+        else activity
+        for activity in activity_list
+    ]
+    if checked_list != cached_list:
+        activity_cache().put(bug.self_link, updated, checked_list)
+    return [activity for activity in checked_list if not activity.suspended]
+
+
+def load_bug(bug_link, activitysubscriber_links):
+    """Load a bug, all of its tasks and its recent activity in a worker thread.
+
+    :param str bug_link: self_link of the bug
+    :param activitysubscriber_links: frozenset of Launchpad person self_links,
+        the recent activity is only fetched if there are any
+    :returns: tuple(bug object, list(bug_task objects of the bug),
+        recent_activity() of the bug or None)
+    """
+    bug = thread_launchpad().load(bug_link)
+    return (
+        bug,
+        list(bug.bug_tasks),
+        recent_activity(bug, activitysubscriber_links)
+        if activitysubscriber_links else None,
+    )
+
+
+def load_bugs(tasks, activitysubscriber_links):
+    """Fetch the bugs of launchpadlib tasks concurrently.
+
+    Reading any attribute of a task's bug costs a round trip to Launchpad,
+    and so do listing its sibling tasks for the release column and reading
+    its last messages. Fetch them all upfront in parallel instead of one
+    after another.
+
+    :param tasks: sequence(bug_task object from launchpadlib)
+    :param activitysubscriber_links: frozenset of Launchpad person self_links,
+        the recent activity is only fetched if there are any
+    :returns: dict of load_bug() results keyed by the bug_link
+    """
+    # Load the activity cache here, the workers must all share the same one.
+    # Without activity subscribers no activity is read, so leave it alone.
+    if activitysubscriber_links:
+        activity_cache()
+    bug_links = list({task.bug_link for task in tasks})
+    return dict(zip(bug_links, _EXECUTOR.map(
+        lambda link: load_bug(link, activitysubscriber_links), bug_links)))
@@ -0,0 +1,133 @@
+"""Test the Launchpad access of ustriage with pytest."""
+import datetime
+from types import SimpleNamespace
+
+from lazr.restfulclient.errors import ClientError
+
+import ustriage.launchpad as target
+
+
+def test_freeze_search_args():
+    """Test that search arguments freeze into an order-independent key."""
+    team = SimpleNamespace(self_link='https://api.launchpad.net/devel/~t')
+    key = target.freeze_search_args('ubuntu', {
+        'bug_subscriber': team,
+        'status': ['New', 'Triaged'],
+        'modified_since': '2019-05-06',
+    })
+    assert key == target.freeze_search_args('ubuntu', {
+        'status': ['New', 'Triaged'],
+        'modified_since': '2019-05-06',
+        'bug_subscriber': team,
+    })
+    assert key == (
+        'ubuntu',
+        ('bug_subscriber', 'https://api.launchpad.net/devel/~t'),
+        ('modified_since', '2019-05-06'),
+        ('status', ('New', 'Triaged')),
+    )
+    hash(key)
+
+
+def test_recent_activity_cached(tmp_path, monkeypatch):
+    """Test that recent activity of an unchanged bug comes from the cache."""
+    monkeypatch.setattr(target, 'ACTIVITY_CACHE_FILE',
+                        str(tmp_path / 'activity.json'))
+    monkeypatch.setattr(target, '_ACTIVITY_CACHES', {})
+    date = datetime.datetime(2021, 4, 15, 12, 0,
+                             tzinfo=datetime.timezone.utc)
+    owner_link = 'https://api.launchpad.net/devel/~me'
+    bug = SimpleNamespace(
+        self_link='https://api.launchpad.net/devel/bugs/1',
+        date_last_updated=date,
+        message_count=1,
+        messages=[SimpleNamespace(date_created=date, owner_link=owner_link)],
+    )
+    links = frozenset([owner_link])
+    expected = [(date, owner_link, None)]
+    assert target.recent_activity(bug, links) == expected
+    target.save_activity_cache()
+    monkeypatch.setattr(target, '_ACTIVITY_CACHES', {})
+
+    del bug.messages
+    assert target.recent_activity(bug, links) == expected
+
+
+def test_recent_activity_suspended(tmp_path, monkeypatch):
+    """Test that messages of suspended accounts are skipped and cached."""
+    monkeypatch.setattr(target, 'ACTIVITY_CACHE_FILE',
+                        str(tmp_path / 'activity.json'))
+    monkeypatch.setattr(target, '_SUSPENDED', {})
+    monkeypatch.setattr(target, '_ACTIVITY_CACHES', {})
+    date = datetime.datetime(2021, 4, 15, 12, 0,
+                             tzinfo=datetime.timezone.utc)
+    links = ['https://api.launchpad.net/devel/~' + name
+             for name in ('me', 'user', 'spammer')]
+    loaded = []
+
+    def load(link):
+        loaded.append(link)
+        if link == links[2]:
+            raise ClientError({'status': '410'}, b'')
+
+    monkeypatch.setattr(target, 'thread_launchpad',
+                        lambda: SimpleNamespace(load=load))
+    bug = SimpleNamespace(
+        self_link='https://api.launchpad.net/devel/bugs/1',
+        date_last_updated=date,
+        message_count=3,
+        messages=[SimpleNamespace(date_created=date, owner_link=link)
+                  for link in links],
+    )
+    expected = [(date, links[0], None), (date, links[1], False)]
+    assert target.recent_activity(bug, frozenset(links[:1])) == expected
+    assert loaded == links[1:]
+    target.save_activity_cache()
+    monkeypatch.setattr(target, '_ACTIVITY_CACHES', {})
+    monkeypatch.setattr(target, '_SUSPENDED', {})
+
+    del bug.messages
+    assert target.recent_activity(bug, frozenset(links[:1])) == expected
+    assert loaded == links[1:]
+
+
+def test_activity_cache_save(tmp_path):
+    """Test that the activity cache is only written when changed and pruned."""
+    filename = tmp_path / 'activity.json'
+    today = datetime.date.today()
+    cache = target.ActivityCache(str(filename))
+    cache.save()
+    assert not filename.exists()
+
+    date = datetime.datetime(2021, 4, 15, 12, 0,
+                             tzinfo=datetime.timezone.utc)
+    activity = [target.Activity(date, 'https://api.launchpad.net/devel/~me')]
+    cache.put('bugs/1', date.isoformat(), activity)
+    cache.put('bugs/2', date.isoformat(), activity)
+    cache.bugs['bugs/2']['used'] = (
+        today - datetime.timedelta(days=target.ACTIVITY_CACHE_MAX_AGE + 1)
+    ).isoformat()
+    cache.save()
+    assert [path.name for path in tmp_path.iterdir()] == ['activity.json']
+
+    cache = target.ActivityCache(str(filename))
+    assert list(cache.bugs) == ['bugs/1']
+    assert cache.get('bugs/1', date.isoformat()) == activity
+    assert not cache.dirty
+
+
+def test_load_bugs_without_activity(monkeypatch):
+    """Test that the activity cache is left alone without subscribers."""
+    def activity_cache_loaded(filename):
+        raise AssertionError('%s loaded' % filename)
+
+    monkeypatch.setattr(target, 'ActivityCache', activity_cache_loaded)
+    monkeypatch.setattr(target, '_ACTIVITY_CACHES', {})
+    bug = SimpleNamespace(bug_tasks=[])
+    monkeypatch.setattr(target, 'thread_launchpad',
+                        lambda: SimpleNamespace(load=lambda link: bug))
+    task = SimpleNamespace(bug_link='https://api.launchpad.net/devel/bugs/1')
+    assert target.load_bugs([task], frozenset()) == {
+        task.bug_link: (bug, [], None),
+    }
+    target.save_activity_cache()
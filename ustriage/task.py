@@ -9,29 +9,17 @@ Copyright 2017-2018 Canonical Ltd.
 Joshua Powers <josh.powers@canonical.com>
 """
 
-import itertools
 import re
 import urllib
 
-from functools import lru_cache
+from functools import cached_property, lru_cache
 
 import debian.deb822
 
-DISTRIBUTION_RESOURCE_TYPE_LINK = (
-    'https://api.launchpad.net/devel/#distribution'
-)
+from .launchpad import fast_target_name, get_distribution
 
-DISTRIBUTION_SOURCE_PACKAGE_RESOURCE_TYPE_LINK = (
-    'https://api.launchpad.net/devel/#distribution_source_package'
-)
-
-SOURCE_PACKAGE_RESOURCE_TYPE_LINK = (
-    'https://api.launchpad.net/devel/#source_package'
-)
-
-PROJECT_RESOURCE_TYPE_LINK = (
-    'https://api.launchpad.net/devel/#project'
-)
+# Task titles look like: Bug #123456 in samba (Ubuntu Jammy): "Summary"
+TITLE_RE = re.compile(r'Bug #(\d+) in (\S+)[^:]*: "(.*)"')
 
 # We used to use red, but the contrast black/dark-red is video encoded badly
 COLOR_CYAN = "\033[0;36m"
@@ -42,11 +30,10 @@ COLOR_RESET = '\033[0m'
 
 def truncate_string(text, length=20):
     """Truncate string and hint visually if truncated."""
-    str_text = str(text)
-    truncated = str_text[0:length]
-    if len(str_text) > length:
-        truncated = truncated[:-1] + '…'
-    return truncated
+    str_text = text if isinstance(text, str) else str(text)
+    if len(str_text) <= length:
+        return str_text
+    return str_text[:length - 1] + '…'
 
 
 def mark(text, color):
@@ -54,15 +41,16 @@ def mark(text, color):
     return color + text + COLOR_RESET
 
 
+@lru_cache(maxsize=None)
 def find_changes_bugs(changes_url):
-    """Return the list of bugs affected by a change URL."""
+    """Return the bugs affected by a change URL, fetching each URL once."""
     with urllib.request.urlopen(changes_url) as changes_fobj:
         changes = debian.deb822.Changes(changes_fobj)
     try:
         bugs_str = changes["Launchpad-Bugs-Fixed"]
     except KeyError:
-        return []
-    return bugs_str.split()
+        return ()
+    return tuple(bugs_str.split())
 
 
 def get_upload_source_urls(upload):
@@ -95,6 +83,43 @@ def get_upload_source_urls(upload):
     raise RuntimeError(f"Cannot find source for {upload}")
 
 
+@lru_cache(maxsize=None)
+def get_series(launchpad, name):
+    """Return an Ubuntu series, fetched once per Launchpad connection."""
+    return get_distribution(launchpad, "ubuntu").getSeries(
+        name_or_version=name)
+
+
+@lru_cache(maxsize=None)
+def unapproved_bug_numbers(launchpad, series, src):
+    """Return the bugs fixed by uploads of src waiting in series-unapproved.
+
+    Many tasks share a source package, so this is worked out only once per
+    series and package.
+    """
+    # Thanks to Rbasak for the code that inspired this
+    uploads = get_series(launchpad, series).getPackageUploads(
+        pocket="Proposed",
+        status="Unapproved",
+        exact_match=True,
+        name=src,
+    )
+    bug_numbers = set()
+    for upload in uploads:
+        try:
+            get_upload_source_urls(upload)
+        except RuntimeError:
+            # Could not get source URLs
+            continue
+        if not upload.changes_file_url:
+            # Could not find changes file
+            continue
+
+        bug_numbers.update(find_changes_bugs(upload.changes_file_url))
+
+    return frozenset(bug_numbers)
+
+
 class Task:
     """Launchpad Bug Task.
 
@@ -107,18 +132,28 @@ class Task:
     LONG_URL_ROOT = 'https://pad.lv/'
     SHORTLINK_ROOT = 'LP: #'
     BUG_NUMBER_LENGTH = 7
+    # Pad bug links to the longest bug number so the columns line up
+    LONG_URL_FORMAT = '%%-%ds' % (BUG_NUMBER_LENGTH + len(LONG_URL_ROOT))
+    SHORTLINK_FORMAT = '%%-%ds' % (BUG_NUMBER_LENGTH + len(SHORTLINK_ROOT))
+    VERIFICATION_NEEDED_FLAG = mark('v', COLOR_CYAN)
+    VERIFICATION_DONE_FLAG = mark('V', COLOR_GREEN)
     AGE = None
     OLD = None
     LP = None
-    NOWORK_BUG_STATUSES = []
-    OPEN_BUG_STATUSES = []
+    NOWORK_BUG_STATUSES = frozenset()
+    OPEN_BUG_STATUSES = frozenset()
+
+    def __init__(self, lp_task=None, bug=None, bug_tasks=None):
+        """Init task object.
 
-    def __init__(self, lp_task=None):
-        """Init task object."""
+        bug and bug_tasks can be passed if the caller already loaded them,
+        otherwise they are fetched on first use.
+        """
         # Whether the team is subscribed to the bug
         self.subscribed = None
         # Whether the last activity was by us
         self.last_activity_ours = None
+        self._preloaded = (bug, bug_tasks)
 
         if lp_task:
             # Some information can be extracted from the task URL itself
@@ -187,9 +222,10 @@ class Task:
         }
 
     @staticmethod
-    def create_from_launchpadlib_object(obj, **kwargs):
+    def create_from_launchpadlib_object(obj, bug=None, bug_tasks=None,
+                                        **kwargs):
         """Create object from launchpadlib."""
-        self = Task()
+        self = Task(bug=bug, bug_tasks=bug_tasks)
         self.obj = obj
         for key, value in kwargs.items():
             setattr(self, key, value)
@@ -223,48 +259,70 @@ class Task:
         """User-facing "shortlink" that gnome-terminal will autolink."""
         return self.SHORTLINK_ROOT + self.number
 
-    @property
-    @lru_cache()
+    @cached_property
+    def _title_match(self):
+        """Match of TITLE_RE against the title, parsing it only once.
+
+        None if the title does not look as expected, the properties derived
+        from it then fall back to the links of the task.
+        """
+        return TITLE_RE.match(self.title)
+
+    @cached_property
     def number(self):
         """Bug number as a string."""
         # This could be str(self.obj.bug.id) but using self.title is
         # significantly faster
-        return self.title.split(' ')[1].replace('#', '')
+        if self._title_match is None:
+            return self.obj.bug_link.rsplit('/', 1)[-1]
+        return self._title_match.group(1)
 
-    @property
-    @lru_cache()
+    @cached_property
+    def _bug(self):
+        """Bug the task belongs to.
+
+        Every access to the bug attribute of a launchpadlib task fetches the
+        bug again, so keep the first one around.
+        """
+        bug = self._preloaded[0]
+        return self.obj.bug if bug is None else bug
+
+    @cached_property
+    def _bug_tasks(self):
+        """All tasks of the bug, listed once."""
+        bug_tasks = self._preloaded[1]
+        return list(self._bug.bug_tasks) if bug_tasks is None else bug_tasks
+
+    @cached_property
     def tags(self):
         """List of the Bugs tags."""
-        return self.obj.bug.tags
+        return self._bug.tags
 
-    @property
-    @lru_cache()
+    @cached_property
     def date_last_updated(self):
         """Last update as datetime returned by launchpad."""
-        return self.obj.bug.date_last_updated
+        return self._bug.date_last_updated
 
-    @property
-    @lru_cache()
+    @cached_property
     def importance(self):
         """Return importance as returned by launchpad."""
         return self.obj.importance
 
-    @property
-    @lru_cache()
+    @cached_property
     def src(self):
         """Source package."""
         # This could be self.target.name but using self.title is
         # significantly faster
-        return self.title.split(' ')[3]
+        if self._title_match is None:
+            return fast_target_name(self.obj)
+        return self._title_match.group(2)
 
-    @property
-    @lru_cache()
+    @cached_property
     def title(self):
         """Title as returned by launchpadlib."""
         return self.obj.title
 
-    @property
-    @lru_cache()
+    @cached_property
     def assignee(self):
         """Assignee as string returned by launchpadlib."""
         # String like https://api.launchpad.net/devel/~ahasenack
@@ -274,63 +332,33 @@ class Task:
             return self.obj.assignee_link.split('~')[1]
         return False
 
-    @property
-    @lru_cache()
+    @cached_property
     def status(self):
         """Status as returned by launchpadlib."""
         return self.obj.status
 
-    @property
-    @lru_cache()
+    @cached_property
     def short_title(self):
         """Bug summary."""
         # This could be self.obj.bug.title but using self.title is
         # significantly faster
-        start_field = {
-            DISTRIBUTION_RESOURCE_TYPE_LINK: 4,
-            DISTRIBUTION_SOURCE_PACKAGE_RESOURCE_TYPE_LINK: 5,
-            SOURCE_PACKAGE_RESOURCE_TYPE_LINK: 6,
-            PROJECT_RESOURCE_TYPE_LINK: 7,
-        }[self.obj.target.resource_type_link]
-        return ' '.join(self.title.split(' ')[start_field:]).replace('"', '')
+        if self._title_match is None:
+            return self.title.replace('"', '')
+        return self._title_match.group(3).replace('"', '')
 
     def _is_in_unapproved(self):
         """Determine if this task is in a -unapproved for a series."""
-        # Thanks to Rbasak for the code that inspired this
-        ubuntu = Task.LP.distributions["ubuntu"]
-
         if not self.series or self.series == '-devel':
             return None
 
-        distro_seriess = [ubuntu.getSeries(name_or_version=self.series)]
-        uploads = itertools.chain.from_iterable(
-            distro_series.getPackageUploads(pocket="Proposed",
-                                            status="Unapproved",
-                                            exact_match=True,
-                                            name=self.src)
-            for distro_series in distro_seriess
-        )
-        for upload in uploads:
-            try:
-                get_upload_source_urls(upload)
-            except RuntimeError:
-                # Could not get source URLs
-                continue
-            if not upload.changes_file_url:
-                # Could not find changes file
-                continue
-
-            bug_numbers = find_changes_bugs(upload.changes_file_url)
-            if self.number in bug_numbers:
-                return True
-
-        return False
+        return self.number in unapproved_bug_numbers(
+            Task.LP, self.series, self.src)
 
-    @property
+    @cached_property
     def _sibling_tasks(self):
         """Return parent bug's other tasks for this package and distro."""
         siblings = {}
-        for lp_task in self.obj.bug.bug_tasks:
+        for lp_task in self._bug_tasks:
             task_elements = str(lp_task).split('/')
             # skip root element and other projects
             if task_elements[4] != 'ubuntu':
@@ -352,7 +380,7 @@ class Task:
 
         Note: This has to stay a fixed length string to maintain the layout
         """
-        release_info = ''
+        release_chars = []
 
         # breaking the URL is faster than checking it all through API
         for series, lp_task in self._sibling_tasks.items():
@@ -368,12 +396,12 @@ class Task:
                 release_char = mark(release_char, COLOR_YELLOW)
             # Remaining e.g. incomplete stay as-is
 
-            release_info += release_char
+            release_chars.append(release_char)
 
         # Due to all the control chars we add, we need to printable to length
-        printable = re.sub('[^A-Z]+', '', release_info, 0)
-        p_len = len(printable)
-        p_need = length - p_len
+        # which is one char per release
+        release_info = ''.join(release_chars)
+        p_need = length - len(release_chars)
         if p_need > 0:
             release_info += ' '*p_need
 
@@ -385,58 +413,59 @@ class Task:
     def _is_old(self):
         return self.OLD and self.date_last_updated < self.OLD
 
+    @cached_property
+    def _verification_tags(self):
+        """Whether the tags mark verification as needed and as done."""
+        needed = done = False
+        for tag in self.tags:
+            if tag.startswith('verification-needed-'):
+                needed = True
+            elif tag.startswith('verification-done-'):
+                done = True
+        return needed, done
+
     def _is_verification_needed(self):
-        return any('verification-needed-' in tag for tag in self.tags)
+        return self._verification_tags[0]
 
     def _is_verification_done(self):
-        return any('verification-done-' in tag for tag in self.tags)
+        return self._verification_tags[1]
 
     def get_flags(self, newbug=False):
         """Get flags representing the status of the task.
 
         Note: This has to stay a fixed length string to maintain the layout
         """
-        verification_needed = mark('v', COLOR_CYAN)
-        verification_done = mark('V', COLOR_GREEN)
-        flags = ''
-        flags += '*' if self.subscribed else ' '
-        flags += '+' if self.last_activity_ours else ' '
-        flags += 'U' if self._is_updated() else 'O' if self._is_old() else ' '
-        flags += 'N' if newbug else ' '
-        flags += verification_needed if self._is_verification_needed() else ' '
-        flags += verification_done if self._is_verification_done() else ' '
-        return flags
+        return ''.join((
+            '*' if self.subscribed else ' ',
+            '+' if self.last_activity_ours else ' ',
+            'U' if self._is_updated() else 'O' if self._is_old() else ' ',
+            'N' if newbug else ' ',
+            self.VERIFICATION_NEEDED_FLAG
+            if self._is_verification_needed() else ' ',
+            self.VERIFICATION_DONE_FLAG
+            if self._is_verification_done() else ' ',
+        ))
 
     def compose_pretty(self, shortlinks=True, extended=False, newbug=False):
         """Compose a printable line of relevant information."""
         if shortlinks:
-            format_string = (
-                '%-' +
-                str(self.BUG_NUMBER_LENGTH + len(self.SHORTLINK_ROOT)) +
-                's'
-            )
-            bug_url = format_string % self.shortlink
+            bug_url = self.SHORTLINK_FORMAT % self.shortlink
         else:
-            format_string = (
-                '%-' +
-                str(self.BUG_NUMBER_LENGTH + len(self.LONG_URL_ROOT)) +
-                's'
-            )
-            bug_url = format_string % self.url
+            bug_url = self.LONG_URL_FORMAT % self.url
 
         text = '%-12s | %6s | %-7s | %-13s | %-19s |' % (
             bug_url,
             self.get_flags(newbug),
             self.get_releases(7),
-            ('%s' % self.status),
-            ('%s' % truncate_string(self.src, 19))
+            self.status,
+            truncate_string(self.src, 19)
         )
         if extended:
             text += ' %8s | %-10s | %-13s |' % (
                 self.date_last_updated.strftime('%d.%m.%y'),
                 self.importance,
                 ('' if not self.assignee
-                 else '%s' % truncate_string(self.assignee, 12))
+                 else truncate_string(self.assignee, 12))
             )
         text += ' %60s |' % truncate_string(self.short_title, 60)
         return text
@@ -444,8 +473,8 @@ class Task:
     def compose_dup(self, extended=False):
         """Compose a printable line of reduced information for a dup."""
         text = '%s,%s' % (
-            ('%s' % self.status),
-            ('%s' % truncate_string(self.src, 16))
+            self.status,
+            truncate_string(self.src, 16)
         )
         if extended and self.assignee:
             text += ",%s" % truncate_string(self.assignee, 9)
@@ -453,7 +482,7 @@ class Task:
 
     def sort_key(self):
         """Sort method."""
-        return (not self.last_activity_ours, self.number, self.src)
+        return (not self.last_activity_ours, int(self.number), self.src)
 
     def sort_date(self):
         """Sort by date."""
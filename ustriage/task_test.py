@@ -0,0 +1,120 @@
+"""Test the Task object with pytest."""
+from types import SimpleNamespace
+
+import pytest
+
+from ustriage import task as task_module
+from ustriage.task import Task, truncate_string
+
+
+def make_task(title):
+    """Create a Task backed by a fake launchpadlib task."""
+    return Task.create_from_launchpadlib_object(SimpleNamespace(title=title))
+
+
+@pytest.mark.parametrize('title,number,src,short_title', [
+    ('Bug #1234567 in samba (Ubuntu): "smbd crashes"',
+     '1234567', 'samba', 'smbd crashes'),
+    ('Bug #1234567 in samba (Ubuntu Jammy): "smbd crashes"',
+     '1234567', 'samba', 'smbd crashes'),
+    ('Bug #123 in Ubuntu: "[FFe] foo: bar"',
+     '123', 'Ubuntu', '[FFe] foo: bar'),
+    ('Bug #123 in qemu (Ubuntu): "Do "not" quote"',
+     '123', 'qemu', 'Do not quote'),
+])
+def test_title_fields(title, number, src, short_title):
+    """Test the fields derived from a task title."""
+    task = make_task(title)
+    assert task.number == number
+    assert task.src == src
+    assert task.short_title == short_title
+
+
+def test_title_fields_unexpected_title():
+    """Test that a title not matching TITLE_RE falls back to the links."""
+    task = Task.create_from_launchpadlib_object(SimpleNamespace(
+        title='Something "odd"',
+        bug_link='https://api.launchpad.net/devel/bugs/1234567',
+        target_link='https://api.launchpad.net/devel/ubuntu/+source/samba',
+    ))
+    assert task.number == '1234567'
+    assert task.src == 'samba'
+    assert task.short_title == 'Something odd'
+
+
+def test_sort_key_numeric():
+    """Test that bugs sort by their number, not its string."""
+    tasks = [make_task('Bug #%s in samba (Ubuntu): "x"' % number)
+             for number in ('1000000', '999999', '123')]
+    assert [t.number for t in sorted(tasks, key=Task.sort_key)] == [
+        '123', '999999', '1000000'
+    ]
+
+
+@pytest.mark.parametrize('text,length,expected', [
+    ('samba', 5, 'samba'),
+    ('samba', 4, 'sam…'),
+    ('', 3, ''),
+    (1234, 3, '12…'),
+])
+def test_truncate_string(text, length, expected):
+    """Test truncating strings to a printable length."""
+    assert truncate_string(text, length) == expected
+
+
+@pytest.mark.parametrize('tags,needed,done', [
+    ([], False, False),
+    (['verification-needed-jammy', 'server-todo'], True, False),
+    (['verification-done-focal', 'verification-needed-jammy'], True, True),
+    (['foo-verification-done-focal'], False, False),
+])
+def test_verification_flags(tags, needed, done):
+    """Test the SRU verification state derived from the bug tags."""
+    task = Task.create_from_launchpadlib_object(
+        None, bug=SimpleNamespace(tags=tags))
+    assert task.get_flags() == '    %s%s' % (
+        Task.VERIFICATION_NEEDED_FLAG if needed else ' ',
+        Task.VERIFICATION_DONE_FLAG if done else ' ',
+    )
+
+
+def test_unapproved_bug_numbers(monkeypatch):
+    """Test collecting the bugs fixed by uploads waiting in unapproved."""
+    changes = {
+        'https://example.com/a.changes': ('1', '2'),
+        'https://example.com/b.changes': ('3',),
+    }
+    changes_fetched = []
+
+    def find_changes_bugs(changes_url):
+        changes_fetched.append(changes_url)
+        return changes[changes_url]
+
+    monkeypatch.setattr(task_module, 'find_changes_bugs', find_changes_bugs)
+    uploads = [
+        SimpleNamespace(contains_source=True, sourceFileUrls=list,
+                        changes_file_url=url)
+        for url in list(changes) + [None]
+    ]
+    upload_searches = []
+
+    def get_package_uploads(**kwargs):
+        upload_searches.append(kwargs['name'])
+        return uploads
+
+    series = SimpleNamespace(getPackageUploads=get_package_uploads)
+
+    class FakeLaunchpad:  # pylint: disable=too-few-public-methods
+        """Hashable stand-in for a Launchpad connection."""
+
+        distributions = {
+            'ubuntu': SimpleNamespace(getSeries=lambda **kwargs: series),
+        }
+
+    launchpad = FakeLaunchpad()
+    for _ in range(2):
+        assert task_module.unapproved_bug_numbers(
+            launchpad, 'jammy', 'samba') == {'1', '2', '3'}
+    # Worked out only once per series and source package
+    assert upload_searches == ['samba']
+    assert changes_fetched == list(changes)
@@ -10,8 +10,8 @@ Christian Ehrhardt <christian.ehrhardt@canonical.com>
 """
 import argparse
 from datetime import date, datetime, timedelta, timezone
+import itertools
 import logging
-import os
 import re
 import sys
 import time
@@ -19,13 +19,19 @@ import webbrowser
 import json
 import yaml
 
-import dateutil.parser
 import dateutil.relativedelta
-from launchpadlib.launchpad import Launchpad
-from launchpadlib.credentials import UnencryptedFileCredentialStore
-
-from lazr.restfulclient.errors import ClientError
 
+from .launchpad import (
+    connect_launchpad,
+    get_person,
+    get_ubuntu,
+    load_bugs,
+    pool_map,
+    save_activity_cache,
+    search_tasks,
+    search_tasks_concurrently,
+    thread_launchpad,
+)
 from .task import Task
 
 PACKAGE_BLACKLIST = {
@@ -43,6 +49,16 @@ DEFAULTTAG = "server-todo"
 FLAG_RECENT_AGE = 6
 FLAG_OLD_AGE = 90
 
+# Day names and their abbreviations as accepted for the triage day
+WEEKDAYS = {
+    name: number
+    for number, day in enumerate([
+        'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday',
+        'sunday',
+    ])
+    for name in (day, day[:3])
+}
+
 # See the "Merge Board Coordination" specification for details about these tags
 PACKAGING_TASK_TAGS = [
     'needs-merge',
@@ -53,7 +69,7 @@ PACKAGING_TASK_TAGS = [
     'needs-ppa-backport',
 ]
 
-POSSIBLE_BUG_STATUSES = [
+POSSIBLE_BUG_STATUSES = (
     "New",
     "Incomplete",
     "Opinion",
@@ -65,99 +81,36 @@ POSSIBLE_BUG_STATUSES = [
     "In Progress",
     "Fix Committed",
     "Fix Released",
-]
+)
 
-OPEN_BUG_STATUSES = [
+OPEN_BUG_STATUSES = (
     "New",
     "Confirmed",
     "Triaged",
     "In Progress",
     "Fix Committed",
-]
+)
 
-NOWORK_BUG_STATUSES = [
+NOWORK_BUG_STATUSES = (
     "Opinion",
     "Invalid",
     "Won't Fix",
     "Expired",
     "Fix Released",
-]
+)
 
-TRACKED_BUG_STATUSES = OPEN_BUG_STATUSES + [
+TRACKED_BUG_STATUSES = OPEN_BUG_STATUSES + (
     "Incomplete",
-]
-
-DISTRIBUTION_RESOURCE_TYPE_LINK = (
-    'https://api.launchpad.net/devel/#distribution'
 )
 
 STR_STRIKETHROUGH = '\u0336'
 
+# Use the libyaml bindings for the bug lists when available
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+YamlDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
 
-def fast_target_name(obj):
-    """Return the name of a bug task's target.
-
-    This is an optimisation hack that saves us from fetching the target object
-    in order to determine its name.
-
-    :param obj: bug_task object from launchpadlib
-    :returns: the equivalent of obj.target.name
-    """
-    return obj.target_link.split('/')[-1]
-
-
-def searchTasks_in_all_active_series(distro, *args, **kwargs):  # noqa: E501 pylint: disable=invalid-name
-    """Unionize searchTasks() for all active series of a distribution.
-
-    A searchTasks() Launchpad call against a Launchpad distribution will not
-    return series tasks if the development task is marked Fix Released (LP:
-    #314432; see also comment 26 in that bug). The workaround is to call
-    searchTasks() individually against both the distribution object itself and
-    also against all required series and unionize the results. This function
-    provides an implementation of this workaround.
-
-    One difference to calling searchTasks() directly is that the tasks returned
-    by this function are targetted either to the distribution or to particular
-    series. It is not possible to return tasks targetted just to the
-    distribution in the general case because no such tasks exist for bugs where
-    the development task is marked Fix Released (the exact case we're fixing).
-
-    This implementation returns only one series task for each found bug and
-    package name, not all of them. An arbitrary task is picked. Only active
-    serieses are considered.
-
-    :param distro: distribution object from launchpadlib
-    :param *args: arguments to pass to the wrapped searchTasks calls
-    :param **kargs: arguments to pass to the wrapped searchTasks calls
-    :rtype: sequence(bug_task object from launchpadlib)
-    """
-    # This workaround implementation is to be called on distribution objects
-    # only; other objects (typically a series directly) are not affected, and
-    # the caller shouldn't be using this workaround in that case. If needed, we
-    # could modify this to wrap searchTasks for other object types if we don't
-    # want the caller to have to know which to use, but YAGNI for now.
-    assert distro.resource_type_link == DISTRIBUTION_RESOURCE_TYPE_LINK
-
-    result = {
-        (task.bug_link, fast_target_name(task)): task
-        for task in distro.searchTasks(*args, **kwargs)
-    }
-    for series in distro.series_collection:
-        if not series.active:
-            continue
-        # Deduplicate against the bug number and source package name as a
-        # key. Keying additionally on the distribution is not required
-        # because all results must be against the same distribution since
-        # that's what we queried against. Here, "target" must be a
-        # source_package object because we queried specifically against a
-        # distro_series so we can assume that a name attribute is always
-        # present.
-        result.update({
-            (task.bug_link, fast_target_name(task)): task
-            for task in series.searchTasks(*args, **kwargs)
-        })
-
-    return result.values()
+# Dates given as YYYY-MM-DD rather than as a triage day
+ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
 
 
 def auto_date_range(keyword, today=None):
@@ -177,7 +130,10 @@ def auto_date_range(keyword, today=None):
     :rtype: tuple(datetime.date, datetime.date)
     """
     today = today or date.today()
-    requested_weekday = dateutil.parser.parse(keyword, ignoretz=True).weekday()
+    try:
+        requested_weekday = WEEKDAYS[keyword.strip().lower()]
+    except KeyError as error:
+        raise ValueError("Unknown day of the week: %s" % keyword) from error
     last_occurrence = today + dateutil.relativedelta.relativedelta(
         weekday=dateutil.relativedelta.weekday(requested_weekday, -1)
     )
@@ -234,43 +190,32 @@ def reverse_auto_date_range(start, end):
     return None
 
 
-def connect_launchpad():
-    """Use the launchpad module connect to launchpad.
+def parse_dates(start, end=None):
+    """Validate dates are setup correctly.
 
-    Will connect you to the Launchpad website the first time you run
-    this to authorize your system to connect.
+    :returns: (start, end) as dates, end being exclusive
     """
-    cred_location = os.path.expanduser('~/.lp_creds')
-    credential_store = UnencryptedFileCredentialStore(cred_location)
-    return Launchpad.login_with('ustriage', 'production', version='devel',
-                                credential_store=credential_store)
-
-
-def parse_dates(start, end=None):
-    """Validate dates are setup correctly."""
     # if start date is not set we search all bugs of a LP user/team
     if not start:
         logging.info('No date set, auto-search yesterday/weekend for the '
                      'most common triage.')
-        yesterday = datetime.now().date() - timedelta(days=1)
+        yesterday = date.today() - timedelta(days=1)
         if yesterday.weekday() != 6:
-            start = yesterday.strftime('%Y-%m-%d')
+            start_date = end_date = yesterday
         else:
             # include weekend if yesterday was a sunday
-            start = (yesterday - timedelta(days=2)).strftime('%Y-%m-%d')
-            end = yesterday.strftime('%Y-%m-%d')
+            start_date = yesterday - timedelta(days=2)
+            end_date = yesterday
 
-    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', start):
+    elif ISO_DATE_RE.fullmatch(start):
+        start_date = date.fromisoformat(start)
         # If end date is not set set it to start so we can
         # properly show the inclusive list of dates.
-        if not end:
-            end = start
+        end_date = date.fromisoformat(end) if end else start_date
 
-    elif start and not end:
+    elif not end:
         try:
             start_date, end_date = auto_date_range(start)
-            start = start_date.strftime('%Y-%m-%d')
-            end = end_date.strftime('%Y-%m-%d')
         except ValueError as error:
             raise ValueError("Cannot parse date: %s" % start) from error
 
@@ -278,10 +223,7 @@ def parse_dates(start, end=None):
         raise ValueError("Cannot parse date range: %s %s" % (start, end))
 
     # Always add one to end date to make the dates inclusive
-    end = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)
-    end = end.strftime('%Y-%m-%d')
-
-    return start, end
+    return start_date, end_date + timedelta(days=1)
 
 
 def handle_files(filename_save, filename_compare, reportedbugs, former_bugs,
@@ -289,11 +231,12 @@ def handle_files(filename_save, filename_compare, reportedbugs, former_bugs,
     """Handle saving and comparing to saved lists of bugs."""
     if filename_save is not None:
         with open(filename_save, "w", encoding='utf-8') as savebugs:
-            yaml.dump(reportedbugs, stream=savebugs)
+            yaml.dump(reportedbugs, stream=savebugs, Dumper=YamlDumper)
         logging.info("Saved reported bugs in %s", filename_save)
 
     if filename_compare is not None:
-        closed_bugs = [x for x in former_bugs if x not in reportedbugs]
+        reported = set(reportedbugs)
+        closed_bugs = [x for x in former_bugs if x not in reported]
         logging.info('')
         logging.info("Bugs gone compared with %s:", filename_compare)
         gone_tasks = bugs_to_tasks(closed_bugs)
@@ -340,7 +283,7 @@ def load_former_bugs(filename_compare):
     former_bugs = []
     if filename_compare is not None:
         with open(filename_compare, "r", encoding='utf-8') as comparebugs:
-            former_bugs = yaml.safe_load(comparebugs)
+            former_bugs = yaml.load(comparebugs, Loader=YamlLoader)
     return former_bugs
 
 
@@ -350,12 +293,12 @@ def load_postponed_bugs(filename_postponed):
     logging.info("\nPostponed bugs:")
     if filename_postponed is not None:
         with open(filename_postponed, "r", encoding='utf-8') as postponebugs:
-            pbugs = yaml.safe_load(postponebugs)
+            pbugs = yaml.load(postponebugs, Loader=YamlLoader)
             for pbug in pbugs:
-                postpone_until = datetime.strptime(pbug[1], '%Y-%m-%d')
-                if postpone_until.date() > datetime.now().date():
+                postpone_until = date.fromisoformat(pbug[1])
+                if postpone_until > date.today():
                     logging.info("%s postponed until %s", pbug[0],
-                                 postpone_until.strftime('%Y-%m-%d'))
+                                 postpone_until.isoformat())
                     postponed_bugs.append(pbug[0])
     if not postponed_bugs:
         logging.info("<None>")
@@ -363,23 +306,29 @@ def load_postponed_bugs(filename_postponed):
     return postponed_bugs
 
 
+def log_further_tasks(further_tasks):
+    """Print the further tasks of the bug on the line above."""
+    logging.info("Also: %s", ", ".join("[%s]" % dup for dup in further_tasks))
+
+
 def print_bugs(tasks, open_in_browser=0, shortlinks=True, blacklist=None,
                limit_subscribed=None, order_by_date=False, is_sorted=False,
                extended=False, filename_save=None, filename_compare=None,
                filename_postponed=None):
     """Print the tasks in a clean-ish format."""
-    blacklist = blacklist or []
+    blacklist = frozenset(blacklist or ())
 
     if is_sorted:
         sorted_filtered_tasks = tasks
     else:
-        sorted_filtered_tasks = sorted(
-            (t for t in tasks if t.src not in blacklist),
+        sorted_filtered_tasks = [t for t in tasks if t.src not in blacklist]
+        sorted_filtered_tasks.sort(
             key=(Task.sort_date if order_by_date else Task.sort_key),
             reverse=order_by_date
         )
 
     former_bugs = load_former_bugs(filename_compare)
+    former = set(former_bugs)
     postponed_bugs = load_postponed_bugs(filename_postponed)
 
     logging.info('Found %s bugs\n', len(sorted_filtered_tasks))
@@ -405,189 +354,138 @@ def print_bugs(tasks, open_in_browser=0, shortlinks=True, blacklist=None,
                    order_by_date=False, is_sorted=True, extended=extended)
         return
 
+    # Keep the list for the saved file order, the set for lookups
     reportedbugs = []
-    further_tasks = ""
+    reported = set()
+    urls = []
+    further_tasks = []
     for task in sorted_filtered_tasks:
-        if task.number in reportedbugs:
-            if further_tasks != "":
-                further_tasks += ", "
-            else:
-                further_tasks += "Also: "
-            further_tasks += "[%s]" % task.compose_dup(extended=extended)
+        if task.number in reported:
+            further_tasks.append(task.compose_dup(extended=extended))
             continue
         if further_tasks:
-            logging.info(further_tasks)
-            further_tasks = ""
+            log_further_tasks(further_tasks)
+            further_tasks = []
 
-        newbug = filename_compare and task.number not in former_bugs
+        newbug = filename_compare and task.number not in former
         bugtext = task.compose_pretty(shortlinks=shortlinks,
                                       extended=extended,
                                       newbug=newbug)
         print_bug_line(bugtext, task, postponed_bugs)
 
-        handle_webbrowser(open_in_browser, task.url)
+        urls.append(task.url)
         reportedbugs.append(task.number)
+        reported.add(task.number)
 
     # There might be one set of further tasks left if no other bug followed
     if further_tasks:
-        logging.info(further_tasks)
-        further_tasks = ""
+        log_further_tasks(further_tasks)
+
+    # Opening is rate limited, so only start once the whole list is shown
+    for url in urls:
+        handle_webbrowser(open_in_browser, url)
 
     handle_files(filename_save, filename_compare, reportedbugs, former_bugs,
                  shortlinks=shortlinks, extended=extended)
 
 
-def last_activity_ours(task, activitysubscribers):
+def last_activity_ours(activity_list, activitysubscriber_links):
     """Work out whether the last person to work on this bug was one of us.
 
-    task: a Launchpad task object
-    activitysubscribers: a set of Launchpad person objects
+    activity_list: the recent_activity() of the bug
+    activitysubscriber_links: a frozenset of Launchpad person self_links
 
     Returns a boolean
     """
-    # If activitysubscribers is empty, then it wasn't one of us
-    if not activitysubscribers:
+    # If activitysubscriber_links is empty, then it wasn't one of us, and
+    # neither if all recent messages were from suspended accounts
+    if not activitysubscriber_links or not activity_list:
         return False
 
-    activitysubscribers_links = {p.self_link for p in activitysubscribers}
-
-    # 1. activity_list shall contain a tuple of (date, person.self_link) pairs
-    # 2. messages collection is ordered and the last few elements are enough
-    # This avoid too many API round trips to launchpad. With 0.1-0.5 seconds
-    # per round trip and some overhead that is ~1.7s per bug now compared to
-    # the former rather excessive times on bugs with many comments
-    # Note: negative like [-3:] slices are not allowed here
-    activity_list = []
-    last_msgs_end = len(task.bug.messages)
-    last_msgs_start = 0 if last_msgs_end < 3 else last_msgs_end-3
-    for msg in task.bug.messages[last_msgs_start:last_msgs_end]:
-        try:
-            activity_list.append((msg.date_created, msg.owner.self_link))
-        except ClientError as exc:
-            if exc.response["status"] == "410":  # gone, user suspended
-                continue
-            raise
-
-    most_recent_activity = activity_list.pop()
-
     # Consider anything within an hour of the last activity or message as
-    # part of the same action
-    recent_activity_threshold = (
-        most_recent_activity[0] - timedelta(hours=1)  # [0] is date
-    )
-    all_recent_activities = [most_recent_activity]
-
-    for next_most_recent_activity in reversed(activity_list):
-        if next_most_recent_activity[0] < recent_activity_threshold:
-            break
-        all_recent_activities.append(next_most_recent_activity)
+    # part of the same action, messages come in the order they were written
+    recent_activity_threshold = activity_list[-1].date - timedelta(hours=1)
 
     # If all of the last action was us, then treat it as ours. If any of the
-    # last action wasn't done by us, then it isn't.
-    return all(
-        a[1] in activitysubscribers_links
-        for a in all_recent_activities
-    )
+    # last action wasn't done by us, then it isn't. Walking backwards stops
+    # at the first message that is older or not ours.
+    for activity in reversed(activity_list):
+        if activity.date < recent_activity_threshold:
+            return True
+        if activity.owner_link not in activitysubscriber_links:
+            return False
+    return True
 
 
 def create_bug_list(
-        start_date, end_date, lpname, bugsubscriber, activitysubscribers,
+        start_date, end_date, lpname, bugsubscriber, activitysubscriber_links,
         tags=None, status=POSSIBLE_BUG_STATUSES
-):  # pylint: disable=dangerous-default-value
-    """Return a list of bugs modified between dates."""
+):
+    """Return a list of bugs modified between dates.
+
+    start_date and end_date are dates, or both None to not limit the search.
+    activitysubscriber_links is a frozenset of the Launchpad person self_links
+    whose activity counts as ours, or None to not check the activity.
+    """
     # Distribution List: https://launchpad.net/distros
     # API Doc: https://launchpad.net/+apidoc/1.0.html
-    launchpad = connect_launchpad()
-    project = launchpad.distributions['Ubuntu']
-    team = launchpad.people[lpname]
+    project = get_ubuntu()
+    team = get_person(lpname)
+
+    if bugsubscriber:
+        # direct subscriber
+        search_filter = {
+            'bug_subscriber': team,
+            'tags': tags,
+            'tags_combinator': 'All',
+            'status': status,
+        }
+    else:
+        # structural_subscriber sans already subscribed
+        search_filter = {
+            'structural_subscriber': team,
+            'status': status,
+        }
 
     if start_date is not None and end_date is not None:
-        if bugsubscriber:
-            # direct subscriber
-            bugs_since_start = {
-                task.self_link: task for task in
-                searchTasks_in_all_active_series(
-                    project,
-                    modified_since=start_date,
-                    bug_subscriber=team,
-                    tags=tags,
-                    tags_combinator='All',
-                    status=status,
-                )}
-            bugs_since_end = {
-                task.self_link: task for task in
-                searchTasks_in_all_active_series(
-                    project,
-                    modified_since=end_date,
-                    bug_subscriber=team,
-                    tags=tags,
-                    tags_combinator='All',
-                    status=status,
-                )}
-
-            # N/A for direct subscribers
-            already_sub_since_start = {}
-
-        else:
-            # structural_subscriber sans already subscribed
-            bugs_since_start = {
-                task.self_link: task for task in
-                searchTasks_in_all_active_series(
-                    project,
-                    modified_since=start_date, structural_subscriber=team,
-                    status=status,
-                )}
-            bugs_since_end = {
-                task.self_link: task for task in
-                searchTasks_in_all_active_series(
-                    project,
-                    modified_since=end_date, structural_subscriber=team,
-                    status=status,
-                )}
-            already_sub_since_start = {
-                task.self_link: task for task in
-                searchTasks_in_all_active_series(
-                    project,
-                    modified_since=start_date, structural_subscriber=team,
-                    bug_subscriber=team,
-                    status=status,
-                )}
+        queries = {
+            'since_start': dict(search_filter,
+                                modified_since=start_date.isoformat()),
+            'since_end': dict(search_filter,
+                              modified_since=end_date.isoformat()),
+        }
+        if not bugsubscriber:
+            queries['already_sub_since_start'] = dict(
+                search_filter,
+                modified_since=start_date.isoformat(),
+                bug_subscriber=team,
+            )
+        results = search_tasks_concurrently(project, queries)
+        bugs_since_start = results['since_start']
+        # N/A for direct subscribers
+        already_sub_links = results.get('already_sub_since_start', {}).keys()
 
         bugs_in_range = {
-            link: task for link, task in bugs_since_start.items()
-            if link not in bugs_since_end
+            link: bugs_since_start[link]
+            for link in bugs_since_start.keys() - results['since_end'].keys()
         }
     else:
-        already_sub_since_start = {}
-        if bugsubscriber:
-            # direct subscriber
-            bugs_in_range = {
-                task.self_link: task for task in
-                searchTasks_in_all_active_series(
-                    project,
-                    bug_subscriber=team,
-                    tags=tags,
-                    tags_combinator='All',
-                    status=status,
-                )}
-        else:
-            # structural_subscriber sans already subscribed
-            bugs_in_range = {
-                task.self_link: task for task in
-                searchTasks_in_all_active_series(
-                    project,
-                    structural_subscriber=team,
-                    status=status,
-                )}
-
-    bugs = {
-        Task.create_from_launchpadlib_object(
+        already_sub_links = frozenset()
+        bugs_in_range = search_tasks(project, **search_filter)
+
+    bugs_by_link = load_bugs(bugs_in_range.values(), activitysubscriber_links)
+    # Tasks are unique per link already, Task itself does not compare equal
+    bugs = []
+    for link, task in bugs_in_range.items():
+        bug, bug_tasks, activity_list = bugs_by_link[task.bug_link]
+        bugs.append(Task.create_from_launchpadlib_object(
             task,
-            subscribed=(link in already_sub_since_start),
-            last_activity_ours=last_activity_ours(task, activitysubscribers),
-        )
-        for link, task in bugs_in_range.items()
-    }
+            bug=bug,
+            bug_tasks=bug_tasks,
+            subscribed=(link in already_sub_links),
+            last_activity_ours=last_activity_ours(
+                activity_list, activitysubscriber_links),
+        ))
 
     return bugs
 
@@ -596,20 +494,29 @@ def bugs_to_tasks(bug_numbers):
     """Return a task structure for a given bug number."""
     # Distribution List: https://launchpad.net/distros
     # API Doc: https://launchpad.net/+apidoc/1.0.html
-    launchpad = connect_launchpad()
+    return list(itertools.chain.from_iterable(
+        pool_map(bug_number_to_tasks, bug_numbers)
+    ))
 
-    tasks = []
-    for bug_number in bug_numbers:
-        bug_tasks = launchpad.bugs[bug_number].bug_tasks
-        for bug_task in bug_tasks:
-            task = Task.create_from_launchpadlib_object(
-                bug_task,
-                subscribed=False,
-                last_activity_ours=False
-            )
-            tasks.append(task)
 
-    return tasks
+def bug_number_to_tasks(bug_number):
+    """Load the tasks of a bug from within a worker thread.
+
+    :param str bug_number: number of the bug
+    :rtype: list(Task)
+    """
+    bug = thread_launchpad().bugs[bug_number]
+    bug_tasks = list(bug.bug_tasks)
+    return [
+        Task.create_from_launchpadlib_object(
+            bug_task,
+            bug=bug,
+            bug_tasks=bug_tasks,
+            subscribed=False,
+            last_activity_ours=False
+        )
+        for bug_task in bug_tasks
+    ]
 
 
 def report_current_backlog(lpname):
@@ -617,15 +524,15 @@ def report_current_backlog(lpname):
 
     This value is usually needed to track how the backlog is growing/shrinking.
     """
-    launchpad = connect_launchpad()
-    project = launchpad.distributions['Ubuntu']
-    team = launchpad.people[lpname]
+    project = get_ubuntu()
+    team = get_person(lpname)
+    subscribed_tasks = search_tasks(
+        project,
+        bug_subscriber=team,
+        status=OPEN_BUG_STATUSES,
+    )
     sub_bugs_count = len(set((
-        task.bug_link for task in searchTasks_in_all_active_series(
-            project,
-            bug_subscriber=team,
-            status=OPEN_BUG_STATUSES,
-        )
+        task.bug_link for task in subscribed_tasks.values()
     )))
     logging.info(
         'Team \'%s\' currently subscribed to %d bugs',
@@ -635,7 +542,7 @@ def report_current_backlog(lpname):
 
 
 def print_tagged_bugs(lpname, expiration, date_range, open_browser,
-                      shortlinks, blacklist, activitysubscribers,
+                      shortlinks, blacklist, activitysubscriber_links,
                       tags, extended,
                       filename_save=None,
                       filename_compare=None, filename_postponed=None):
@@ -654,18 +561,16 @@ def print_tagged_bugs(lpname, expiration, date_range, open_browser,
         logging.info('Bugs tagged "%s" and subscribed "%s" and not touched'
                      ' in %s days',
                      ' '.join(tags), lpname, expiration['expire_tagged'])
-        expire_start = (datetime.strptime(date_range['start'], '%Y-%m-%d')
+        expire_start = (date_range['start']
                         - timedelta(days=expiration['expire_tagged']))
-        expire_end = (datetime.strptime(date_range['end'], '%Y-%m-%d')
+        expire_end = (date_range['end']
                       - timedelta(days=expiration['expire_tagged']))
-        expire_start = expire_start.strftime('%Y-%m-%d')
-        expire_end = expire_end.strftime('%Y-%m-%d')
         wanted_statuses = OPEN_BUG_STATUSES
 
     bugs = create_bug_list(
         expire_start,
         expire_end,
-        lpname, TEAMLPNAME, activitysubscribers,
+        lpname, TEAMLPNAME, activitysubscriber_links,
         tags=tags + ["-bot-stop-nagging"],
         status=wanted_statuses
     )
@@ -688,12 +593,10 @@ def print_subscribed_bugs(lpname, expiration, date_range, open_browser,
     else:
         logging.info('Bugs subscribed to %s and not touched in %s days',
                      lpname, expiration['expire'])
-        expire_start = (datetime.strptime(date_range['start'], '%Y-%m-%d')
+        expire_start = (date_range['start']
                         - timedelta(days=expiration['expire']))
-        expire_end = (datetime.strptime(date_range['end'], '%Y-%m-%d')
+        expire_end = (date_range['end']
                       - timedelta(days=expiration['expire']))
-        expire_start = expire_start.strftime('%Y-%m-%d')
-        expire_end = expire_end.strftime('%Y-%m-%d')
         tags = ["-bot-stop-nagging"]
 
     bugs = create_bug_list(
@@ -720,16 +623,18 @@ def main(date_range=None, debug=False, open_browser=None,
         tags = ["server-todo"]
     launchpad = connect_launchpad()
     Task.LP = launchpad
-    Task.NOWORK_BUG_STATUSES = NOWORK_BUG_STATUSES
-    Task.OPEN_BUG_STATUSES = OPEN_BUG_STATUSES
+    # Only used for lookups per bug task, searches keep the ordered tuples
+    Task.NOWORK_BUG_STATUSES = frozenset(NOWORK_BUG_STATUSES)
+    Task.OPEN_BUG_STATUSES = frozenset(OPEN_BUG_STATUSES)
     logging.basicConfig(stream=sys.stdout, format='%(message)s',
                         level=logging.DEBUG if debug else logging.INFO)
     if activitysubscribernames:
-        activitysubscribers = (
-            launchpad.people[activitysubscribernames].participants
-        )
+        # Walk the paged collection once rather than in every bug list
+        activitysubscriber_links = frozenset(
+            p.self_link
+            for p in get_person(activitysubscribernames).participants)
     else:
-        activitysubscribers = []
+        activitysubscriber_links = frozenset()
 
     if show_tagged:
         if json_format:
@@ -738,7 +643,7 @@ def main(date_range=None, debug=False, open_browser=None,
                 None,
                 lpname,
                 TEAMLPNAME,
-                activitysubscribers,
+                activitysubscriber_links,
                 tags=tags + ["-bot-stop-nagging"],
                 status=TRACKED_BUG_STATUSES
             )
@@ -749,7 +654,7 @@ def main(date_range=None, debug=False, open_browser=None,
                 default=str)
         else:
             print_tagged_bugs(lpname, None, None, open_browser['triage'],
-                              shortlinks, blacklist, activitysubscribers,
+                              shortlinks, blacklist, activitysubscriber_links,
                               tags, extended, filename_save, filename_compare,
                               filename_postponed)
 
@@ -759,6 +664,7 @@ def main(date_range=None, debug=False, open_browser=None,
                               blacklist, limit_subscribed, extended)
 
     if show_no_triage:
+        save_activity_cache()
         return
 
     report_current_backlog(lpname)
@@ -766,11 +672,8 @@ def main(date_range=None, debug=False, open_browser=None,
                                                          date_range['end'])
 
     # Need to display date range as inclusive
-    inclusive_start = datetime.strptime(date_range['start'], '%Y-%m-%d')
-    inclusive_end = (
-        datetime.strptime(date_range['end'], '%Y-%m-%d') -
-        timedelta(days=1)
-    )
+    inclusive_start = date_range['start']
+    inclusive_end = date_range['end'] - timedelta(days=1)
     pretty_start = inclusive_start.strftime('%Y-%m-%d (%A)')
     pretty_end = inclusive_end.strftime('%Y-%m-%d (%A)')
     if inclusive_start == inclusive_end:
@@ -795,7 +698,7 @@ def main(date_range=None, debug=False, open_browser=None,
     tags = [f"-{t}" for t in PACKAGING_TASK_TAGS]
     bugs = create_bug_list(
         date_range['start'], date_range['end'],
-        lpname, bugsubscriber, activitysubscribers,
+        lpname, bugsubscriber, activitysubscriber_links,
         tags=tags
     )
     print_bugs(bugs, open_browser['triage'], shortlinks, blacklist=blacklist,
@@ -803,12 +706,14 @@ def main(date_range=None, debug=False, open_browser=None,
 
     if expiration['show_expiration']:
         print_tagged_bugs(lpname, expiration, date_range, open_browser['exp'],
-                          shortlinks, blacklist, activitysubscribers, tags,
-                          extended)
+                          shortlinks, blacklist, activitysubscriber_links,
+                          tags, extended)
         print_subscribed_bugs(lpname, expiration, date_range,
                               open_browser['exp'], shortlinks, blacklist,
                               None, extended)
 
+    save_activity_cache()
+
 
 def launch():
     """Parse arguments provided."""
@@ -974,14 +879,16 @@ For each of those characters the tool will express:
     date_range = {'start': args.start_date,
                   'end': args.end_date}
 
+    # Both flags are relative to the same point in time
+    now = datetime.now(timezone.utc)
     if args.age is False and (args.show_subscribed or args.show_tagged):
         args.age = FLAG_RECENT_AGE
     if args.age is not False:
-        Task.AGE = datetime.now(timezone.utc) - timedelta(days=args.age)
+        Task.AGE = now - timedelta(days=args.age)
     if args.old is False and (args.show_subscribed or args.show_tagged):
         args.old = FLAG_OLD_AGE
     if args.old is not False:
-        Task.OLD = datetime.now(timezone.utc) - timedelta(days=args.old)
+        Task.OLD = now - timedelta(days=args.old)
 
     main(date_range, args.debug, open_browser,
          args.lpname, args.bugsubscriber, not args.fullurls,
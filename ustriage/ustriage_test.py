@@ -3,6 +3,7 @@ import datetime
 
 import pytest
 
+from ustriage.launchpad import Activity
 import ustriage.ustriage as target
 
 
@@ -16,6 +17,8 @@ def parse_test_date(date_string):
     ('2019-05-14', 'tue', '2019-05-13', '2019-05-13'),
     ('2019-05-13', 'tue', '2019-05-06', '2019-05-06'),
     ('2019-05-14', 'wed', '2019-05-07', '2019-05-07'),
+    ('2019-05-14', 'Monday', '2019-05-10', '2019-05-12'),
+    ('2019-05-14', ' THU ', '2019-05-08', '2019-05-08'),
 ])
 def test_auto_date_range(today, keyword, start, end):
     """Test date range."""
@@ -36,6 +39,17 @@ def test_auto_date_range_weekend(today, keyword):
         target.auto_date_range(keyword, today=today)
 
 
+@pytest.mark.parametrize('today,keyword', [
+    ('2019-05-14', 'someday'),
+    ('2019-05-14', ''),
+])
+def test_auto_date_range_unknown(today, keyword):
+    """Test keywords that do not name a day."""
+    today = parse_test_date(today)
+    with pytest.raises(ValueError):
+        target.auto_date_range(keyword, today=today)
+
+
 @pytest.mark.parametrize('start,end,expected', [
     ('2019-05-10', '2019-05-12', 'Monday triage'),
     ('2019-05-06', '2019-05-06', 'Tuesday triage'),
@@ -54,3 +68,25 @@ def test_reverse_auto_date_range(start, end, expected):
     assert target.reverse_auto_date_range(
         parse_test_date(start), parse_test_date(end)
     ) == expected
+
+
+def test_last_activity_ours():
+    """Test that only the last action by subscribers counts as ours."""
+    ours = 'https://api.launchpad.net/devel/~me'
+    theirs = 'https://api.launchpad.net/devel/~you'
+    start = datetime.datetime(2021, 4, 15, 12, 0)
+
+    def activity(*minutes_and_owners):
+        return [
+            Activity(start + datetime.timedelta(minutes=minutes), link)
+            for minutes, link in minutes_and_owners
+        ]
+
+    links = frozenset([ours])
+    assert target.last_activity_ours(activity((0, theirs), (90, ours)), links)
+    assert not target.last_activity_ours(
+        activity((0, ours), (90, theirs)), links)
+    # Anything within an hour of the last message is part of the same action
+    assert not target.last_activity_ours(
+        activity((0, theirs), (30, ours)), links)
+    assert not target.last_activity_ours(activity((0, ours)), frozenset())